@@ -43,7 +43,7 @@ class InputFileDetails:
         self.geotransform = None
         self.projection = None
 
-        self.input_band_details: Tuple[str, int, BandType] = []
+        self.input_band_details: List[Tuple[str, int, BandType]] = []
 
         # pink chart filename, if one was given
         self.pink_chart_filename = None
@@ -382,9 +382,17 @@ def _get_bag_details(input_file):
         )
 
     depth_raster = gdal.Open(input_file)
+    if depth_raster is None:
+        raise RuntimeError(
+            f'input file {input_file} could not be opened'
+        )
     depth_size_x = depth_raster.RasterXSize
     depth_size_y = depth_raster.RasterYSize
     density_raster = gdal.Open(input_file_density)
+    if density_raster is None:
+        raise RuntimeError(
+            f'input file {input_file_density} could not be opened'
+        )
     density_size_x = density_raster.RasterXSize
     density_size_y = density_raster.RasterYSize
 
@@ -409,6 +417,10 @@ def _get_bag_details(input_file):
     ifd = InputFileDetails()
     ifd.size_x = depth_size_x
     ifd.size_y = depth_size_y
+    # the density file is checked to be the same size as the depth file, so
+    # it is assumed to share its geotransform and projection
+    ifd.geotransform = depth_raster.GetGeoTransform()
+    ifd.projection = depth_raster.GetProjection()
     # band order is assumed based on convention
     ifd.add_band_details(
         input_file,
@@ -449,15 +461,15 @@ def get_input_details(
     if len(inputfiles) == 0:
         raise RuntimeError("No gridded input files provided")
 
-    if (inputfiles[0].lower().endswith('.tif')
-            or inputfiles[0].lower().endswith('.tiff')):
+    first_inputfile = inputfiles[0].lower()
+    if first_inputfile.endswith(('.tif', '.tiff')):
         # assume all files are tif files if the first one is
         tifdetails = _get_tiff_details(inputfiles)
         inputdetails.append(tifdetails)
-    elif inputfiles[0].lower().endswith('_density.bag'):
+    elif first_inputfile.endswith('_density.bag'):
         # ignore these bag files, we'll handle these in the next if case
         pass
-    elif inputfile[0].lower().endswith('.bag'):
+    elif first_inputfile.endswith('.bag'):
         bagdetails = _get_bag_details(inputfiles[0])
         inputdetails.append(bagdetails)
 
@@ -83,27 +83,35 @@ class Executor:
             self.temp_dirs.append(temp_dir)
             temp_dir_path = Path(temp_dir)
 
-            raster_inputs = []
-            raster_outputs = []
             pc_output = temp_dir_path.joinpath(Path(ifd.pink_chart_filename).stem + "_pinkchart.tif")
+            raster_outputs: Dict[Path, Path] = {}
+            used_outputs = {pc_output}
 
             for input_file, band_index, band_type in ifd.input_band_details:
-                output_file = temp_dir_path.joinpath(Path(input_file).stem + ".tif")
+                input_path = Path(input_file)
                 # The pink chart processor processes whole geotiffs including all the bands
                 # to make sure we don't unecessarily process the same input raster multiple
                 # times (as would be the case with a multi band geotiff), we filter out duplicates
                 # here.
                 # Also, while reprocessing duplicates worked on MacOS it failed on Windows
-                if Path(input_file) not in raster_inputs:
-                    raster_inputs.append(Path(input_file))
-                    raster_outputs.append(output_file)
-
-                processed_ifd.add_band_details(str(output_file), band_index, band_type)
+                if input_path not in raster_outputs:
+                    output_file = temp_dir_path.joinpath(input_path.stem + ".tif")
+                    # inputs that share a stem (eg; x.tif and x.tiff) would be
+                    # written to the same output, so give these a unique name
+                    name_index = 1
+                    while output_file in used_outputs:
+                        output_file = temp_dir_path.joinpath(f"{input_path.stem}_{name_index}.tif")
+                        name_index += 1
+                    used_outputs.add(output_file)
+                    raster_outputs[input_path] = output_file
+
+                processed_ifd.add_band_details(
+                    str(raster_outputs[input_path]), band_index, band_type)
 
             pcp = PinkChartProcessor(
-                raster_inputs,
+                list(raster_outputs.keys()),
                 Path(ifd.pink_chart_filename),
-                raster_outputs,
+                list(raster_outputs.values()),
                 pc_output
             )
             pcp.process()
@@ -117,7 +125,13 @@ class Executor:
             # to the input file details
             processed_ifd.add_band_details(str(pc_output), 1, BandType.pinkChart)
 
-    def _load_band_tile(self, filename: str, band_index: int, tile: Tile, zeroed_nulls: bool=False):
+    def _load_band_tile(
+            self,
+            filename: str,
+            band_index: int,
+            tile: Tile,
+            zeroed_nulls: bool=False,
+            dtype=None):
         # function may be called even when the band was not given as input
         # by the user. In such cases the filename and band index will be
         # None. It's up to the checks later on to handle being given None
@@ -130,12 +144,12 @@ class Executor:
             raise RuntimeError(f"Could not open {filename}")
 
         src_band = src_ds.GetRasterBand(band_index)
-        band_data = np.array(src_band.ReadAsArray(
+        band_data = src_band.ReadAsArray(
             tile.min_x,
             tile.min_y,
             tile.max_x - tile.min_x,
             tile.max_y - tile.min_y
-        ))
+        )
 
         # we need to mask the nodata values otherwise whatever value is used
         # for nodata will appear in the results
@@ -143,21 +157,24 @@ class Executor:
         # https://github.com/ausseabed/finder-grid-checks/issues/2
         nodata = src_band.GetNoDataValue()
         if nodata is None:
-            # TODO; this should return a masked array like the other two cases
-            return band_data
+            mask = np.zeros(band_data.shape, dtype=bool)
         elif np.isnan(nodata):
             # we need a special case for when NaN is used as nodata because NaN != NaN
             mask = np.isnan(band_data)
-            if zeroed_nulls:
-                band_data[mask] = 0
-            masked_band_data = ma.masked_where(mask, band_data)
-            return masked_band_data
         else:
             mask = band_data == nodata
-            if zeroed_nulls:
-                band_data[mask] = 0
-            masked_band_data = ma.masked_where(mask, band_data)
-            return masked_band_data
+        if zeroed_nulls:
+            band_data[mask] = 0
+        # cast the raw data (if required) before it's wrapped, casting the
+        # masked array would also copy its mask
+        if dtype is not None:
+            band_data = band_data.astype(dtype, copy=False)
+
+        # the mask is always given as a full boolean array (never `nomask`) so
+        # the checks run on this tile all share it rather than each creating
+        # their own. The band data was read for this tile only, so there's no
+        # need to copy it either.
+        return ma.masked_array(band_data, mask=mask, copy=False)
 
     def _load_data(self, ifd: InputFileDetails, tile: Tile):
         '''
@@ -174,15 +191,12 @@ class Executor:
             depth_file, depth_band_idx, tile)
         # makes sense for density to have null data of any value converted to zero
         density_data = self._load_band_tile(
-            density_file, density_band_idx, tile, True)
+            density_file, density_band_idx, tile, True, int)
         uncertainty_data = self._load_band_tile(
             uncertainty_file, uncertainty_band_idx, tile)
         pinkchart_data = self._load_band_tile(
             pinkchart_file, pinkchart_band_idx, tile)
 
-        if density_data is not None:
-            density_data = density_data.astype(int)
-
         return (depth_data, density_data, uncertainty_data, pinkchart_data)
 
     def _get_output_file_location(
@@ -208,27 +222,26 @@ class Executor:
         Runs each of the checks assigned to each file (via the
         InputFileDetails) on the loaded data arrays
         '''
-        # total number of check that will be run. Not all of them included in
-        # the ifd.check_ids_and_params list will be run here as the checks
-        # may not be implented by this plugin
-        total_check_count = 0
+        # Not all of the checks included in the ifd.check_ids_and_params list
+        # will be run here as the checks may not be implented by this plugin.
+        # Look up the check classes once, and keep only those that are.
+        supported_checks = []
         for check_id, check_params in ifd.check_ids_and_params:
-            if get_check(check_id, self.checks) is None:
+            check_class = get_check(check_id, self.checks)
+            if check_class is None:
                 # then the check is not supported by this tool
                 # so skip and move on
                 continue
-            total_check_count +=1
+            supported_checks.append((check_id, check_params, check_class))
+
+        # total number of check that will be run
+        total_check_count = len(supported_checks)
 
         count = 0
-        for check_id, check_params in ifd.check_ids_and_params:
+        for check_id, check_params, check_class in supported_checks:
             if is_stopped is not None and is_stopped():
                 return
 
-            check_class = get_check(check_id, self.checks)
-            if check_class is None:
-                # then the check is not supported by this tool
-                # so skip and move on
-                continue
             check = check_class(check_params)
 
             check.spatial_export = self.spatial_export
@@ -8,7 +8,7 @@ from pathlib import PurePath
 from tempfile import TemporaryDirectory
 import distutils
 from distutils import dir_util
-from typing import Optional, Dict, List, Any
+from typing import Optional, Dict, List, Any, Tuple
 from ausseabed.qajson.model import QajsonParam, QajsonOutputs, QajsonExecution
 from .data import InputFileDetails
 from .tiling import Tile
@@ -132,6 +132,15 @@ class GridCheck:
         else:
             return param.value
 
+    @staticmethod
+    def _data_and_mask(array: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        ''' Splits a (masked) array into its data and a boolean mask array of
+        the same shape. The checks work on these rather than the masked array
+        to avoid numpy's masked array overhead on each operation. Plain
+        arrays are given a mask of all False.
+        '''
+        return ma.getdata(array), ma.getmaskarray(array)
+
     def run(
             ifd: InputFileDetails,
             tile: Tile,
@@ -5,8 +5,8 @@ from ausseabed.mbesgc.lib.tiling import Tile
 
 import collections
 import logging
+import math
 import numpy as np
-import numpy.ma as ma
 import scipy.ndimage as ndimage
 import geojson
 from geojson import MultiPolygon
@@ -35,6 +35,10 @@ class DensityCheck(GridCheck):
     ]
     parameter_help_link='user_manual_qax_MBESGC.html#mbesgc-density-params'
 
+    # sounding counts from 0 up to (but not including) this value are stored
+    # in the dense histogram array, any others in the sparse histogram dict
+    _dense_histogram_size = 65536
+
     def __init__(self, input_params: List[QajsonParam]):
         super().__init__(input_params)
 
@@ -55,6 +59,89 @@ class DensityCheck(GridCheck):
         # was this check run without a density layer (the only layer it needs)
         self.missing_density = False
 
+        # histogram of sounding counts, the index is the soundings per node
+        # and the value the number of nodes with that many soundings. Sounding
+        # counts that don't fit in this (negative, or unmasked fill values)
+        # are kept in the sparse dict of soundings per node to number of nodes
+        self._hist = np.zeros(256, dtype=np.int64)
+        self._sparse_hist = {}
+
+    @property
+    def density_histogram(self) -> Dict[int, int]:
+        '''
+        histogram as a dict of soundings per node to number of nodes, only
+        sounding counts that occur are included
+        '''
+        # following gets serialized to JSON and as numpy types are not
+        # supported by default we convert the int64 types to plain python ints
+        soundings_counts = np.flatnonzero(self._hist)
+        hist = dict(zip(
+            soundings_counts.tolist(),
+            self._hist[soundings_counts].tolist()
+        ))
+        hist.update(self._sparse_hist)
+        return dict(sorted(hist.items()))
+
+    @density_histogram.setter
+    def density_histogram(self, hist: Dict[int, int]) -> None:
+        self._hist = np.zeros(256, dtype=np.int64)
+        self._sparse_hist = {}
+        self._add_counts(
+            np.fromiter(hist.keys(), dtype=np.int64, count=len(hist)),
+            np.fromiter(hist.values(), dtype=np.int64, count=len(hist))
+        )
+
+    def _add_to_histogram(self, counts: np.ndarray) -> None:
+        '''
+        adds the counts (indexed by soundings per node) to the histogram,
+        growing the histogram if counts includes larger sounding counts
+        '''
+        if len(counts) > len(self._hist):
+            self._hist = np.concatenate((
+                self._hist,
+                np.zeros(len(counts) - len(self._hist), dtype=np.int64)
+            ))
+        self._hist[:len(counts)] += counts
+
+    def _add_counts(
+            self,
+            sounding_counts: np.ndarray,
+            counts: np.ndarray) -> None:
+        '''
+        adds the number of nodes (counts) with each of the (unique) sounding
+        counts to the histogram
+        '''
+        in_range = \
+            (sounding_counts >= 0) & (sounding_counts < self._dense_histogram_size)
+
+        dense_sounding_counts = sounding_counts[in_range]
+        if dense_sounding_counts.size > 0:
+            dense_counts = np.zeros(
+                dense_sounding_counts.max() + 1, dtype=np.int64)
+            dense_counts[dense_sounding_counts] = counts[in_range]
+            self._add_to_histogram(dense_counts)
+
+        for soundings_count, count in zip(
+                sounding_counts[~in_range].tolist(),
+                counts[~in_range].tolist()):
+            self._sparse_hist[soundings_count] = \
+                self._sparse_hist.get(soundings_count, 0) + count
+
+    def _add_values_to_histogram(self, values: np.ndarray) -> None:
+        '''
+        adds the soundings per node of each of the nodes in values to the
+        histogram
+        '''
+        if values.size == 0:
+            return
+        if values.min() >= 0 and values.max() < self._dense_histogram_size:
+            self._add_to_histogram(np.bincount(values))
+        else:
+            # negative or very large sounding counts (eg; fill values of a
+            # band without nodata) can't be counted with bincount
+            unique_vals, unique_counts = np.unique(values, return_counts=True)
+            self._add_counts(unique_vals, unique_counts)
+
     def run(
             self,
             ifd: InputFileDetails,
@@ -82,30 +169,23 @@ class DensityCheck(GridCheck):
             self.density_histogram = {}
             return
 
-        # generate histogram of counts
-        # unique_vals will be the soundings per node
-        # unique_counts is the total number of times the unique_val soundings
-        # count was found.
-        unique_vals, unique_counts = np.unique(density, return_counts=True)
-        hist = {}
-        for (val, count) in zip(unique_vals, unique_counts):
-            if isinstance(val, ma.core.MaskedConstant):
-                continue
-            # following gets serialized to JSON and as numpy types are not
-            # supported by default we convert the float32 and int64 types to
-            # plain python ints
-            hist[int(val)] = int(count)
-
-        self.density_histogram = hist
+        density_data, density_mask = self._data_and_mask(density)
+
+        # generate histogram of counts, the index being the soundings per node
+        # and the value the number of nodes with that many soundings. The
+        # executor loads density as ints, so the cast doesn't normally copy.
+        self._hist = np.zeros(0, dtype=np.int64)
+        self._sparse_hist = {}
+        self._add_values_to_histogram(
+            density_data[~density_mask].astype(np.int64, copy=False)
+        )
 
         if not (self.spatial_export or self.spatial_export_location):
             # if we don't generate spatial outputs, then there's no
             # need to do any further processing
             return
 
-        bad_cells_mask = density < self._min_spn
-        bad_cells_mask.fill_value = False
-        bad_cells_mask = bad_cells_mask.filled()
+        bad_cells_mask = (density_data < self._min_spn) & ~density_mask
         bad_cells_mask_int8 = bad_cells_mask.astype(np.int8)
 
         src_affine = Affine.from_gdal(*ifd.geotransform)
@@ -247,11 +327,17 @@ class DensityCheck(GridCheck):
         '''
         self.start_time = last_check.start_time
 
-        for soundings_count, last_count in last_check.density_histogram.items():
-            if soundings_count in self.density_histogram:
-                self.density_histogram[soundings_count] += last_count
-            else:
-                self.density_histogram[soundings_count] = last_count
+        self._add_to_histogram(last_check._hist)
+        self._add_counts(
+            np.fromiter(
+                last_check._sparse_hist.keys(),
+                dtype=np.int64,
+                count=len(last_check._sparse_hist)),
+            np.fromiter(
+                last_check._sparse_hist.values(),
+                dtype=np.int64,
+                count=len(last_check._sparse_hist))
+        )
 
         self.tiles_geojson.coordinates.extend(
             last_check.tiles_geojson.coordinates
@@ -261,7 +347,7 @@ class DensityCheck(GridCheck):
 
     def get_outputs(self) -> QajsonOutputs:
 
-        if len(self.density_histogram) == 0:
+        if not (self._hist.any() or self._sparse_hist):
             # then there's been nothing but nodata for all tiles
             # posisbly caused by pink chart (coverage) not overlapping
             # raster data.
@@ -292,22 +378,22 @@ class DensityCheck(GridCheck):
                 check_state=GridCheckState.cs_fail
             )
 
-        # sort the list of sounding counts and the number of occurrences
-        counts = collections.OrderedDict(
-            sorted(self.density_histogram.items()))
-
         messages = []
         data = {}
         check_state = None
 
-        lowest_sounding_count, occurrences = next(iter(counts.items()))
-
-        total_soundings = sum(counts.values())
-        under_threshold_soundings = 0
-        for sounding_count, occurrences in counts.items():
-            if sounding_count >= self._min_spn:
-                break
-            under_threshold_soundings += occurrences
+        # the histogram is indexed by sounding count, so the nodes under the
+        # threshold are all those before the first sounding count that meets
+        # the minimum
+        threshold_index = max(0, math.ceil(self._min_spn))
+        total_soundings = \
+            int(self._hist.sum()) + sum(self._sparse_hist.values())
+        under_threshold_soundings = \
+            int(self._hist[:threshold_index].sum()) + sum(
+                count
+                for soundings_count, count in self._sparse_hist.items()
+                if soundings_count < self._min_spn
+            )
 
         percentage_over_threshold = \
             (1.0 - under_threshold_soundings / total_soundings) * 100.0
@@ -323,9 +409,11 @@ class DensityCheck(GridCheck):
         if check_state is None:
             check_state = GridCheckState.cs_pass
 
-        str_key_counts = collections.OrderedDict()
-        for key, val in counts.items():
-            str_key_counts[str(key)] = val
+        # sounding counts and the number of occurrences, in order of sounding
+        # count
+        str_key_counts = collections.OrderedDict(
+            (str(key), val) for key, val in self.density_histogram.items()
+        )
 
         data['chart'] = {
             'type': 'histogram',
@@ -442,11 +530,6 @@ class TvuCheck(GridCheck):
         a = self._depth_error
         b = self._depth_error_factor
 
-        # some tools produce negative uncertainty values which will cause
-        # problems with the threshold check. So calculate the abs values
-        # and use this to check against.
-        uncertainty = np.absolute(uncertainty)
-
         # count of all cells/nodes/pixels that are not NaN in the uncertainty
         # array
         self.total_cell_count = int(uncertainty.count())
@@ -456,13 +539,29 @@ class TvuCheck(GridCheck):
             self.failed_cell_count = 0
             return
 
-        # calculate allowable uncertainty based on equation and depth data
-        allowable_uncertainty = np.sqrt(a**2 + (b * depth)**2)
+        depth_data, depth_mask = self._data_and_mask(depth)
+        uncertainty_data, uncertainty_mask = self._data_and_mask(uncertainty)
+        # nodes are only checked where both depth and uncertainty are given
+        nodata_mask = depth_mask | uncertainty_mask
 
-        failed_uncertainty = uncertainty > allowable_uncertainty
-
-        failed_uncertainty.fill_value = False
-        failed_uncertainty = failed_uncertainty.filled()
+        # some tools produce negative uncertainty values which will cause
+        # problems with the threshold check. So calculate the abs values
+        # and use this to check against.
+        uncertainty_data = np.absolute(uncertainty_data)
+
+        # calculate allowable uncertainty based on equation and depth data.
+        # This is done in place on a single array to avoid allocating a
+        # temporary array for each step, nodata values in the depth data may
+        # overflow but these are masked out.
+        with np.errstate(over='ignore', invalid='ignore'):
+            allowable_uncertainty = depth_data * b
+            np.square(allowable_uncertainty, out=allowable_uncertainty)
+            allowable_uncertainty += a**2
+            np.sqrt(allowable_uncertainty, out=allowable_uncertainty)
+            allowable_uncertainty[nodata_mask] = 0
+
+            failed_uncertainty = \
+                (uncertainty_data > allowable_uncertainty) & ~nodata_mask
         failed_uncertainty_int8 = failed_uncertainty.astype(np.int8)
 
         # count of cells that failed the check
@@ -818,33 +917,45 @@ class ResolutionCheck(GridCheck):
             self.failed_cell_count = 0
             return
 
-        abs_depth = np.abs(depth)
+        depth_data, depth_mask = self._data_and_mask(depth)
+
         abs_threshold_depth = abs(self._threshold_depth)
 
-        # refer to docs at top of class defn, this is described there
-        fds = np.piecewise(
-            abs_depth,
-            [
-                abs_depth < abs_threshold_depth,
-                abs_depth >= abs_threshold_depth
-            ],
-            [
-                lambda d: self._a_fds_depth_multiplier * d + self._a_fds_depth_constant,
-                lambda d: self._b_fds_depth_multiplier * d + self._b_fds_depth_constant
-            ]
+        # depths may be given as positive or negative values, so the absolute
+        # depth is used. The fds, and then allowable grid size, are
+        # calculated in place in this array to avoid allocating temporary
+        # arrays for each step.
+        allowable_grid_size = np.absolute(
+            depth_data,
+            dtype=np.promote_types(depth_data.dtype, np.float32)
         )
+        # the "Above Threshold" params apply to depths shallower than the
+        # threshold depth, and the "Below Threshold" params to those at or
+        # deeper than it
+        deeper_than_threshold = allowable_grid_size >= abs_threshold_depth
+        shallower_than_threshold = ~deeper_than_threshold
 
-        fds = np.ma.masked_where(np.ma.getmask(depth), fds)
-        allowable_grid_size = fds * self._fds_multiplier
+        # refer to docs at top of class defn, this is described there
+        np.multiply(
+            allowable_grid_size, self._a_fds_depth_multiplier,
+            out=allowable_grid_size, where=shallower_than_threshold)
+        np.add(
+            allowable_grid_size, self._a_fds_depth_constant,
+            out=allowable_grid_size, where=shallower_than_threshold)
+        np.multiply(
+            allowable_grid_size, self._b_fds_depth_multiplier,
+            out=allowable_grid_size, where=deeper_than_threshold)
+        np.add(
+            allowable_grid_size, self._b_fds_depth_constant,
+            out=allowable_grid_size, where=deeper_than_threshold)
+        allowable_grid_size *= self._fds_multiplier
 
         # The idea of the standard here is that the deeper the water gets the
         # less ability you have to pick up features on the seafloor and also
         # features become less important the deeper the water gets as under
         # keel clearance for ships becomes less of an issue.
-        failed_resolution = allowable_grid_size < self.grid_resolution
-
-        failed_resolution.fill_value = False
-        failed_resolution = failed_resolution.filled()
+        failed_resolution = \
+            (allowable_grid_size < self.grid_resolution) & ~depth_mask
         failed_resolution_int8 = failed_resolution.astype(np.int8)
 
         # count of cells that failed the check
@@ -939,8 +1050,8 @@ class ResolutionCheck(GridCheck):
             ogr_dataset.Destroy()
 
         if self.spatial_export:
-            allowable_grid_size.fill_value = -9999.0
-            allowable_grid_size = allowable_grid_size.filled()
+            allowable_grid_size = np.where(
+                depth_mask, -9999.0, allowable_grid_size)
 
             ar = self._get_tmp_file('allowable_resolution', 'tif', tile)
             tile_ds = gdal.GetDriverByName('GTiff').Create(
@@ -1,7 +1,8 @@
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass
 from pathlib import Path
 import logging
 import math
-import numpy as np
 import os
 
 from osgeo import gdal
@@ -9,16 +10,46 @@ from osgeo import ogr
 from osgeo import osr
 from typing import List, Tuple
 
-from .tiling import get_tiles, Tile
-
 
 logger = logging.getLogger(__name__)
 
+# creation options used for all GeoTIFFs generated by the pink chart processor.
+# Outputs are tiled so that block based reads/writes are efficient.
+TIFF_CREATION_OPTIONS = [
+    "COMPRESS=DEFLATE",
+    "TILED=YES",
+    "BLOCKXSIZE=256",
+    "BLOCKYSIZE=256",
+    "BIGTIFF=IF_SAFER",
+]
+
 
+def tiff_creation_options(data_type: int, num_threads: str = "ALL_CPUS") -> List[str]:
+    """
+    Gets the GeoTIFF creation options for a raster of the given GDAL data type.
+    The horizontal differencing predictor (2) only suits integer data, the
+    floating point predictor (3) is used for float data.
+    `num_threads` is the number of threads GDAL uses to compress the output.
+    """
+    if data_type in (gdal.GDT_Float32, gdal.GDT_Float64):
+        predictor = 3
+    else:
+        predictor = 2
+    return TIFF_CREATION_OPTIONS + [
+        f"PREDICTOR={predictor}",
+        f"NUM_THREADS={num_threads}",
+    ]
+
+
+@dataclass(frozen=True, slots=True)
 class Extents():
     """
     Extents object for managing bounding box type information of raster datasets
     """
+    min_x: float
+    min_y: float
+    max_x: float
+    max_y: float
 
     @classmethod
     def from_geotransform(cls, geo_transform: List[float], sizeX: int, sizeY: int):
@@ -30,28 +61,11 @@ class Extents():
         max_y = geo_transform[3]
         max_x = min_x + geo_transform[1] * sizeX
         min_y = max_y + geo_transform[5] * sizeY
-        return Extents(min_x, min_y, max_x, max_y)
-
-    def __init__(self, min_x: float, min_y: float, max_x: float, max_y:float) -> None:
-        self.min_x: float = min_x
-        self.min_y: float = min_y
-        self.max_x: float = max_x
-        self.max_y: float = max_y
+        return cls(min_x, min_y, max_x, max_y)
 
     def to_list(self) -> List[float]:
         return [self.min_x, self.min_y, self.max_x, self.max_y]
 
-    def __eq__(self, other: "Extents") -> bool:
-        return (
-            self.min_x == other.min_x and
-            self.min_y == other.min_y and
-            self.max_x == other.max_x and
-            self.max_y == other.max_y
-        )
-    
-    def __str__(self) -> str:
-        return f"{self.min_x}, {self.min_y}, {self.max_x}, {self.max_y}"
-
 
 class PinkChartProcessor():
     """
@@ -104,15 +118,12 @@ class PinkChartProcessor():
         and a target value. The returned value will always be the `source_val` +/- 
         a multiple of the `res`.
         """
-        d = source_val - target_val        
-        d_units = d / res
-
-        if is_min:
-            d_units = math.ceil(d_units)
-        elif not is_min:
-            d_units = math.floor(d_units)
+        d_units = (source_val - target_val) / res
+        # min extents are rounded so they're at or below the target value, and
+        # max extents so they're at or above it
+        round_units = math.ceil if is_min else math.floor
 
-        return source_val - d_units * res
+        return source_val - round_units(d_units) * res
 
     def _calc_ideal_extents(
             self,
@@ -136,16 +147,54 @@ class PinkChartProcessor():
 
         return Extents(i_min_x, i_min_y, i_max_x, i_max_y)
 
+    def _get_feature_extent(self, layer: ogr.Layer) -> Tuple[float, float, float, float]:
+        """
+        Calculates the extent of all features within the `layer`. Returned as
+        (min_x, max_x, min_y, max_y) to match `ogr.Layer.GetExtent`. Falls back
+        to the layer extent if no feature has a geometry.
+        """
+        extent = None
+        layer.ResetReading()
+        for feature in layer:
+            geometry = feature.GetGeometryRef()
+            if geometry is None or geometry.IsEmpty():
+                continue
+            e = geometry.GetEnvelope()
+            if extent is None:
+                extent = e
+            else:
+                extent = (
+                    min(extent[0], e[0]),
+                    max(extent[1], e[1]),
+                    min(extent[2], e[2]),
+                    max(extent[3], e[3]),
+                )
+        layer.ResetReading()
+
+        if extent is None:
+            extent = layer.GetExtent(force=1)
+        return extent
+
     def _rasterize(
             self,
             dataset: gdal.Dataset,
-            layer: ogr.Layer,
+            vector_filename: str,
+            layer_name: str,
         ) -> None:
         """
-        Rasterizes the `layer` into the `dataset`. All features are burnt into the
-        raster and a value of 1 is used.
+        Rasterizes the layer `layer_name` of `vector_filename` into the `dataset`.
+        All features are burnt into the raster and a value of 1 is used.
         """
-        gdal.RasterizeLayer(dataset, [1], layer, burn_values=[1])
+        # the RASTER optimisation iterates over the raster blocks in the outer
+        # loop, this is much faster than the default for tiled outputs that
+        # include more than a handful of features
+        options = gdal.RasterizeOptions(
+            layers=[layer_name],
+            bands=[1],
+            burnValues=[1],
+            optim="RASTER"
+        )
+        gdal.Rasterize(dataset, vector_filename, options=options)
 
     def _warp(
             self,
@@ -154,65 +203,57 @@ class PinkChartProcessor():
             extents: Extents,
             res_x: float,
             res_y: float,
+            size_x: int,
+            size_y: int,
+            num_threads: str = "ALL_CPUS",
             cutline_dataset_name: str = None,
             cutline_layer_name: str = None,
         ) -> None:
         """
-        Performs a GDAL warp operation. Pushes the `source` data into the extents and
-        resolution given.
-        Will use cutline to clips source raster data if cutline dataset and layer
-        details are given.
+        Performs a GDAL warp operation. Pushes the `source` data into the extents,
+        resolution and size (in pixels) given. `num_threads` is the number of
+        threads GDAL uses to compress the output.
+        Will use cutline to clip source raster data if cutline dataset and layer
+        details are given; any pixels outside the cutline are set to nodata.
         """
-        # get the datatype from the first band, in a tiff file all bands share the
-        # same type
+        # in a tiff file all bands share the same datatype and nodata value
         band: gdal.Band = source.GetRasterBand(1)
         dt = band.DataType
         nodata = band.GetNoDataValue()
 
-        drv_tiff: gdal.Driver = gdal.GetDriverByName("GTiff")
-        out_raster: gdal.Dataset = drv_tiff.Create(
-            str(output),
-            int((extents.max_x - extents.min_x) / res_x),
-            int((extents.max_y - extents.min_y) / res_y),
-            source.RasterCount,
-            dt,
-            options=["COMPRESS=DEFLATE"]
-        )
-        gt = [
+        output_bounds = [
             extents.min_x,
-            res_x,
-            0,
+            extents.max_y - size_y * res_y,
+            extents.min_x + size_x * res_x,
             extents.max_y,
-            0,
-            -res_y,
         ]
 
-        out_raster.SetGeoTransform(gt)
-        out_raster.SetProjection(source.GetProjection())
+        # letting GDAL create the output dataset (rather than warping into a
+        # dataset we've created) means it applies the cutline and nodata
+        # itself in a single pass over the data. Without -overwrite GDAL
+        # would try to warp into an existing output file, and fail as
+        # creation options are given.
+        options = gdal.WarpOptions(
+            options=['-overwrite'],
+            format="GTiff",
+            outputBounds=output_bounds,
+            width=size_x,
+            height=size_y,
+            srcNodata=nodata,
+            dstNodata=nodata,
+            cutlineDSName=cutline_dataset_name,
+            cutlineLayer=cutline_layer_name,
+            creationOptions=tiff_creation_options(dt, num_threads)
+        )
+        out_raster: gdal.Dataset = gdal.Warp(str(output), source, options=options)
 
-        # we need to explicitly set the no data for each band, passing this in as
-        # a WarpOption isn't enough
+        # warp doesn't carry across the band descriptions
         for band_index in range(1, source.RasterCount+1):
-            aband: gdal.Band = out_raster.GetRasterBand(band_index)
-            aband.SetNoDataValue(nodata)
-
-        if (cutline_dataset_name is None or cutline_layer_name is None):
-            options = gdal.WarpOptions(srcNodata=nodata, dstNodata=nodata)
-        else:
-            options = gdal.WarpOptions(
-                srcNodata=nodata,
-                dstNodata=nodata,
-                cutlineDSName=cutline_dataset_name,
-                cutlineLayer=cutline_layer_name
-            )
-        gdal.Warp(out_raster, source, options=options)
+            source_band: gdal.Band = source.GetRasterBand(band_index)
+            out_band: gdal.Band = out_raster.GetRasterBand(band_index)
+            out_band.SetDescription(source_band.GetDescription())
 
         out_raster.FlushCache()
-
-        self.size_x = out_raster.RasterXSize
-        self.size_y = out_raster.RasterYSize
-        self.geotransform = gt
-
         del out_raster
 
     def process(self):
@@ -221,6 +262,15 @@ class PinkChartProcessor():
         versions of the source raster data that lines up with the pinkchart
         raster
         """
+        # each source raster is warped in its own thread, so two sources
+        # sharing an output would write over each other at the same time
+        output_files = {f.absolute() for f in self.output_raster_files}
+        if len(output_files) != len(self.output_raster_files):
+            raise RuntimeError(
+                'Output raster files must be unique, got '
+                f'{[str(f) for f in self.output_raster_files]}'
+            )
+
         # Open up one of the source raster files to get some details about the
         # dataset, we use these later to calculate extents for the pinkchart raster
         # that align with this raster
@@ -237,10 +287,11 @@ class PinkChartProcessor():
         # NOTE: It has been observed that sometimes the extents of a shapefile don't necessarily
         # match that of the features within the shapefile. One shapefile presented significantly
         # larger extents than any feature it contained, as such more processing (and memory) was
-        # used than really required.
+        # used than really required. Hence the extents are calculated from the
+        # features themselves.
         pc_vector: ogr.DataSource = ogr.Open(str(self.pinkchart_file.absolute()))
         pc_layer: ogr.Layer = pc_vector.GetLayer()
-        pc_layer_extent_values = pc_layer.GetExtent(force=1)
+        pc_layer_extent_values = self._get_feature_extent(pc_layer)
         pc_layer_min_x, pc_layer_max_x, pc_layer_min_y, pc_layer_max_y = pc_layer_extent_values
 
         ogr_srs_raster = osr.SpatialReference()
@@ -264,15 +315,28 @@ class PinkChartProcessor():
         # will line up with the source raster data
         tapped_extents = self._calc_ideal_extents(res_x, res_y, data_raster_extents, pc_layer_extents)
 
+        # the pink chart raster and all the warped source rasters share this
+        # grid, so calculate it once here rather than in each warp
+        self.size_x = int((tapped_extents.max_x - tapped_extents.min_x) / res_x)
+        self.size_y = int((tapped_extents.max_y - tapped_extents.min_y) / res_y)
+        self.geotransform = [
+            tapped_extents.min_x,
+            res_x,
+            0,
+            tapped_extents.max_y,
+            0,
+            -res_y,
+        ]
+
         # create a new raster, the pinkchart raster data will be written to this
         drv_tiff: gdal.Driver = gdal.GetDriverByName("GTiff")
         pc_raster: gdal.Dataset = drv_tiff.Create(
             str(self.rasterised_file.absolute()),
-            int((tapped_extents.max_x - tapped_extents.min_x) / res_x),
-            int((tapped_extents.max_y - tapped_extents.min_y) / res_y),
+            self.size_x,
+            self.size_y,
             1,
             gdal.gdalconst.GDT_Byte,
-            options=["COMPRESS=DEFLATE"]
+            options=tiff_creation_options(gdal.gdalconst.GDT_Byte)
         )
         pc_raster_gt = list(data_raster_gt)
         pc_raster_gt[0] = tapped_extents.min_x
@@ -281,7 +345,11 @@ class PinkChartProcessor():
         pc_raster.SetProjection(data_raster_proj)
 
         # rasterize the pink chart
-        self._rasterize(pc_raster, pc_layer)
+        self._rasterize(
+            pc_raster,
+            str(self.pinkchart_file.absolute()),
+            pc_layer.GetName()
+        )
 
         # GDAL can be a little picky about when it actually writes data to
         # file. Runnning these following lines seems to be the best way to
@@ -289,112 +357,66 @@ class PinkChartProcessor():
         pc_raster.FlushCache()
         del pc_raster
 
-        pc_ds: gdal.Dataset = gdal.Open(str(self.rasterised_file.absolute()))
-        # we create this raster above, so it's always band 1
-        pc_band: gdal.Band = pc_ds.GetRasterBand(1)
-
         # now warp each of the source rasters into the ideal extents of the
-        # pink chart
-        for index, src_filename in enumerate(self.raster_files):
-            dest_filename = self.output_raster_files[index]
-            data_raster: gdal.Dataset = gdal.Open(str(src_filename.absolute()))
-
-            self._warp(
-                data_raster,
-                dest_filename,
-                tapped_extents,
-                res_x,
-                res_y,
-                cutline_dataset_name=str(self.pinkchart_file.absolute()),
-                cutline_layer_name=pc_layer.GetName()
-            )
-
-            # warp the source data into a dataset with the same extents as the
-            # pink chart. While it has the same extents of the pink chart, it
-            # isn't clipped to the pink chart at this stage.
-            fn, ext = os.path.splitext(dest_filename)
-            warped_filename = f"{fn}.warp{ext}"
-            self._warp(
-                data_raster,
-                warped_filename,
-                tapped_extents,
-                res_x,
-                res_y
-            )
-
-            ds_source: gdal.Dataset = gdal.Open(warped_filename)
-            ds_source_datatype = ds_source.GetRasterBand(1).DataType
-
-            # create a new dataset that will include a clipped version of the input
-            # data
-            ds_output: gdal.Dataset = gdal.GetDriverByName('GTiff').Create(
-                str(dest_filename.absolute()),
-                ds_source.RasterXSize,
-                ds_source.RasterYSize,
-                ds_source.RasterCount,
-                ds_source_datatype,
-                options=["COMPRESS=DEFLATE"]
-            )
-            ds_output.SetProjection(pc_ds.GetProjection())
-            ds_output.SetGeoTransform(pc_ds.GetGeoTransform())
-
-            # we're going to process this data on a block by block basis, as this is
-            # a nice compromise between being fast and not loading the entire dataset
-            # into memory
-            size_x = ds_source.RasterXSize
-            size_y = ds_source.RasterYSize
-            tile_size_x, tile_size_y = ds_source.GetRasterBand(1).GetBlockSize()
-            tiles = get_tiles(
-                0,
-                0,
-                size_x,
-                size_y,
-                tile_size_x,
-                tile_size_y
-            )
-
-            # copy description and nodata value to each output band
-            for band_index in range(1, ds_source.RasterCount+1):
-                band_source: gdal.Band = ds_source.GetRasterBand(band_index)
-                band_output: gdal.Band = ds_output.GetRasterBand(band_index)
-                band_output.SetNoDataValue(band_source.GetNoDataValue())
-                band_output.SetDescription(band_source.GetDescription())
-
-            # now loop through each on of the tiles (geotiff blocks)
-            for i, tile in enumerate(tiles):
-                # read the pink chart (coverage area) data for this tile
-                # we only need to read this once for all the bands
-                pc_data = np.array(pc_band.ReadAsArray(
-                    tile.min_x,
-                    tile.min_y,
-                    tile.max_x - tile.min_x,
-                    tile.max_y - tile.min_y
-                ))
-
-                # loop through each one of the bands in the source dataset
-                for band_index in range(1, ds_source.RasterCount+1):
-                    # load the input data
-                    band_source: gdal.Band = ds_source.GetRasterBand(band_index)
-                    band_source_data = np.array(band_source.ReadAsArray(
-                        tile.min_x,
-                        tile.min_y,
-                        tile.max_x - tile.min_x,
-                        tile.max_y - tile.min_y
-                    ))
-                    
-                    # this is where the data is clipped to the pink chart (coverage
-                    # area) dataset. Basically we just replace all the indexes in the
-                    # band_source_data array where the pink chart is 0 with nodata
-                    # and leave the rest of the source data unchanged.
-                    band_source_data[pc_data == 0] = band_source.GetNoDataValue()
-
-                    # now write the modified source data back to the output file
-                    band_output: gdal.Band = ds_output.GetRasterBand(band_index)
-                    band_output.WriteRaster(
-                        tile.min_x, tile.min_y,
-                        tile.width, tile.height,
-                        band_source_data.tobytes(),
-                        tile.width, tile.height,
-                        ds_source_datatype
-                    )
+        # pink chart. Each source raster is independent of the others, and GDAL
+        # releases the GIL during warp and IO, so these are run concurrently.
+        pc_layer_name = pc_layer.GetName()
+        max_workers = min(len(self.raster_files), os.cpu_count() or 1)
+        # GDAL compresses each output with all CPUs by default. Only do this
+        # when there's a single warp, otherwise each of the concurrent warps
+        # would start a thread per CPU.
+        num_threads = "ALL_CPUS" if max_workers == 1 else "1"
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(
+                    self._process_one,
+                    index,
+                    src_filename,
+                    tapped_extents,
+                    res_x,
+                    res_y,
+                    self.size_x,
+                    self.size_y,
+                    num_threads,
+                    pc_layer_name
+                )
+                for index, src_filename in enumerate(self.raster_files)
+            ]
+            wait(futures)
+            # calling result will re-raise any exception caught in the thread
+            for future in futures:
+                future.result()
+
+    def _process_one(
+            self,
+            index: int,
+            src_filename: Path,
+            tapped_extents: Extents,
+            res_x: float,
+            res_y: float,
+            size_x: int,
+            size_y: int,
+            num_threads: str,
+            cutline_layer_name: str
+        ) -> None:
+        """
+        Warps a single source raster (`self.raster_files[index]`) into the
+        ideal extents of the pink chart, clipping it to the pink chart. May be
+        run from a worker thread, so all GDAL datasets are opened here and not
+        shared between threads.
+        """
+        dest_filename = self.output_raster_files[index]
+        data_raster: gdal.Dataset = gdal.Open(str(src_filename.absolute()))
 
+        self._warp(
+            data_raster,
+            dest_filename,
+            tapped_extents,
+            res_x,
+            res_y,
+            size_x,
+            size_y,
+            num_threads=num_threads,
+            cutline_dataset_name=str(self.pinkchart_file.absolute()),
+            cutline_layer_name=cutline_layer_name
+        )
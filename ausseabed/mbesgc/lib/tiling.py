@@ -42,9 +42,12 @@ class Tile:
         dst_proj.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
         coord_trans = osr.CoordinateTransformation(src_proj, dst_proj)
 
+        # transform all the corners in a single call
         coordinates = [
-            coord_trans.TransformPoint(coord[0], coord[1], 0.0)[:2]
-            for coord in coordinates
+            coord[:2]
+            for coord in coord_trans.TransformPoints(
+                [(x, y, 0.0) for x, y in coordinates]
+            )
         ]
 
         return Polygon(coordinates=coordinates)
@@ -64,21 +67,58 @@ def get_tiles(min_x, min_y, max_x, max_y, size_x, size_y):
     assert size_x != 0
     assert size_y != 0
 
-    dX = int(max_x) - int(min_x)
-    dY = int(max_y) - int(min_y)
-    whole_steps_x = dX / int(size_x)
-    whole_steps_y = dY / int(size_y)
-    rX = dX % whole_steps_x
-    rY = dY % whole_steps_y
-
-    tiles = []
-    for y in range(int(min_y), int(max_y), int(size_y)):
-        next_y = y + int(size_y)
-        next_y = max_y if next_y > max_y else next_y
-        for x in range(int(min_x), int(max_x), int(size_x)):
-            next_x = x + int(size_x)
-            next_x = max_x if next_x > max_x else next_x
-            tile = Tile(x, y, next_x, next_y)
-            tiles.append(tile)
-
-    return tiles
+    # the bounds along each axis are shared by a whole row or column of
+    # tiles, so are only calculated once. These are kept as python ints
+    # as they're used as GDAL read/write offsets.
+    x_bounds = [
+        (x, min(x + int(size_x), max_x))
+        for x in range(int(min_x), int(max_x), int(size_x))
+    ]
+    y_bounds = [
+        (y, min(y + int(size_y), max_y))
+        for y in range(int(min_y), int(max_y), int(size_y))
+    ]
+
+    return [
+        Tile(x, y, next_x, next_y)
+        for y, next_y in y_bounds
+        for x, next_x in x_bounds
+    ]
+
+
+class TileIndex:
+    '''
+    The tiles generated by `get_tiles` along with a lookup of the tile that
+    includes a given pixel. As tiles are on a regular grid the tile is
+    calculated from the pixel location rather than searching all tiles.
+    '''
+
+    def __init__(self, min_x, min_y, max_x, max_y, size_x, size_y):
+        self.min_x = int(min_x)
+        self.min_y = int(min_y)
+        self.max_x = max_x
+        self.max_y = max_y
+        self.size_x = int(size_x)
+        self.size_y = int(size_y)
+
+        self.tiles = get_tiles(min_x, min_y, max_x, max_y, size_x, size_y)
+        # number of tiles in each row
+        self._count_x = len(range(self.min_x, int(max_x), self.size_x))
+
+    def locate(self, px, py) -> Tile:
+        '''
+        Gets the tile that includes the pixel at px, py
+        '''
+        if not (self.min_x <= px < self.max_x and self.min_y <= py < self.max_y):
+            raise ValueError(f"Pixel ({px}, {py}) is not within any tile")
+        index_x = int(px - self.min_x) // self.size_x
+        index_y = int(py - self.min_y) // self.size_y
+        return self.tiles[index_y * self._count_x + index_x]
+
+
+def get_tile_index(min_x, min_y, max_x, max_y, size_x, size_y) -> TileIndex:
+    '''
+    Breaks the given extents down into tiles (see `get_tiles`), returning an
+    index that supports looking up the tile for a given pixel.
+    '''
+    return TileIndex(min_x, min_y, max_x, max_y, size_x, size_y)
@@ -1,10 +1,14 @@
-from typing import List, Dict, NoReturn, Callable, Tuple, Any, Set
+import functools
+import weakref
+from typing import List, Dict, NoReturn, Callable, Tuple, Any, Set, Optional
 from pathlib import Path
 
 
 from ausseabed.mbesgc.lib.allchecks import all_checks
 from ausseabed.mbesgc.lib.data import inputs_from_qajson_checks, get_file_details
 from ausseabed.mbesgc.lib.executor import Executor
+from ausseabed.mbesgc.lib.mbesgridcheck import DensityCheck, TvuCheck, \
+    ResolutionCheck
 
 from hyo2.qax.lib.plugin import QaxCheckToolPlugin, QaxCheckReference, \
     QaxFileType
@@ -43,15 +47,45 @@ class MbesGridChecksQaxPlugin(QaxCheckToolPlugin):
         ),
     ]
 
+    # summary fields whose names include a parameter value, these are
+    # matched on (field_section, field name prefix) when there is no exact
+    # match in the summary handlers
+    _summary_prefix_fields: List[Tuple[str, str]] = [
+        ("DENSITY", r"% of nodes with"),
+    ]
+
+    # check references are built from the static `all_checks` and `file_types`
+    # so are only built once and shared by all plugin instances
+    _cached_check_references: List[QaxCheckReference] = None
+
     def __init__(self):
         super(MbesGridChecksQaxPlugin, self).__init__()
         # name of the check tool
         self.name = 'MBES Grid Checks'
-        self._check_references = self._build_check_references()
+        self._check_references = self._get_check_references()
+        self._summary_handlers = self._build_summary_handlers()
+
+        # all checks of the qajson, lookup of filename to the checks that
+        # include that file, and the density percentage parameter. Only valid
+        # for the qajson referenced by `_summary_cache_qajson_ref`, a weak
+        # reference so the cache doesn't keep the qajson alive
+        self._summary_checks: List[QajsonCheck] = None
+        self._summary_file_checks: Dict[str, List[QajsonCheck]] = {}
+        self._summary_percentage_node_number: str = None
+        self._summary_cache_qajson_ref: weakref.ref = None
+        # file name (excluding path) of each full filename
+        self._basename_cache: Dict[str, str] = {}
 
         self.exe = None
 
-    def _build_check_references(self) -> List[QaxCheckReference]:
+    @classmethod
+    def _get_check_references(cls) -> List[QaxCheckReference]:
+        if cls._cached_check_references is None:
+            cls._cached_check_references = cls._build_check_references()
+        return cls._cached_check_references
+
+    @classmethod
+    def _build_check_references(cls) -> List[QaxCheckReference]:
         data_level = "survey_products"
         check_refs = []
 
@@ -62,7 +96,7 @@ class MbesGridChecksQaxPlugin(QaxCheckToolPlugin):
                 name=mgc_check_class.name,
                 data_level=data_level,
                 description=None,
-                supported_file_types=MbesGridChecksQaxPlugin.file_types,
+                supported_file_types=cls.file_types,
                 default_input_params=mgc_check_class.input_params,
                 version=mgc_check_class.version,
                 parameter_help_link=mgc_check_class.parameter_help_link,
@@ -79,42 +113,60 @@ class MbesGridChecksQaxPlugin(QaxCheckToolPlugin):
         to match the plugin's output with the QAJSON outputs that must be
         updated with the check results.
         """
-        set_a = set([str(p.path) for p in a.files])
-        set_b = set([str(p.path) for p in b.files])
+        if len(a.files) != len(b.files):
+            return False
+        set_a = {str(p.path) for p in a.files}
+        set_b = {str(p.path) for p in b.files}
         return set_a == set_b
 
-    def get_summary_details(self, qajson: QajsonRoot) -> List[Tuple[str, str]]:
-        # it may be worth moving these header files to their own
-        # dedicated qax plugin, that is always run irrespective
-        # of what plugins are selected by the user.
-        # Currently if the user doesn't run the MBES Grid Checks
-        # plugin (this one), then these header fields won't be
-        # available
+    def _get_percentage_node_number(self, qajson: QajsonRoot) -> str:
+        """ Gets the min soundings per node at percentage parameter from the
+        density check in the qajson, as this needs to be included in the
+        summary label. Defaults to '5' if not found.
+        """
+        self._validate_summary_cache(qajson)
+        if self._summary_percentage_node_number is not None:
+            return self._summary_percentage_node_number
 
         percentage_node_number = '5'
 
         # look through all the checks in the qajson to find the denisty check
-        # and from this density check pull out the min soundings per node at percentage
-        # parameter as this needs to be included in the summary label
+        # and from this density check pull out the parameter
         density_check = next(
             (
                 c
                 for c in qajson.qa.survey_products.checks
-                if c.info.name == 'Density Check'
+                if c.info.name == DensityCheck.name
             ),
             None
         )
         if density_check:
-            min_s_a_p = next(
-                (
-                    p
-                    for p in density_check.inputs.params
-                    if p.name == 'Minimum Soundings per node at percentage'
-                ),
-                None
+            # reversed so the first param is used if names are duplicated
+            params_by_name = {
+                p.name: p.value
+                for p in reversed(density_check.inputs.params)
+            }
+            percentage_node_number = params_by_name.get(
+                'Minimum Soundings per node at percentage',
+                percentage_node_number
             )
-            if min_s_a_p:
-                percentage_node_number = min_s_a_p.value
+
+        self._summary_percentage_node_number = percentage_node_number
+        return percentage_node_number
+
+    def get_summary_details(self, qajson: QajsonRoot) -> List[Tuple[str, str]]:
+        # it may be worth moving these header files to their own
+        # dedicated qax plugin, that is always run irrespective
+        # of what plugins are selected by the user.
+        # Currently if the user doesn't run the MBES Grid Checks
+        # plugin (this one), then these header fields won't be
+        # available
+
+        # the summary details are requested at the start of each summary, the
+        # qajson may have been changed in place (files or params) since the
+        # last so any cached details are rebuilt
+        self.invalidate_summary_cache()
+        percentage_node_number = self._get_percentage_node_number(qajson)
 
         return [
             ("header", "File Name"),
@@ -131,28 +183,192 @@ class MbesGridChecksQaxPlugin(QaxCheckToolPlugin):
             ("RESOLUTION", "Resolution Check QAX Message"),
         ]
 
-    def _revision_from_filename(self, filename: str) -> str:
+    @staticmethod
+    @functools.lru_cache(maxsize=512)
+    def _revision_from_filename(filename: str) -> str:
         """ Extracts  revision id from the filename. This is indicated by a token
-        of the filename starting with `r`
+        of the filename starting with `r`. Results are cached as this is called
+        for the same filenames each time the summary is generated.
         """
-        potential_separators = ['-', '_', ' ']
         name_only = filename
-        separator = None
-        separator_count = 0
-        for sep in potential_separators:
-            c = name_only.count(sep)
-            if c > separator_count:
-                separator = sep
-                separator_count = c
-
-        if separator_count == 0:
+
+        # names without any separator can't contain a revision token, the
+        # substring checks are cheaper than tallying each character
+        if not any(sep in name_only for sep in '-_ '):
             return name_only
 
+        # tally all potential separators in a single pass over the name. The
+        # most common is used as the separator, with ties going to the first
+        # listed here.
+        separator_counts = {'-': 0, '_': 0, ' ': 0}
+        for c in name_only:
+            if c in separator_counts:
+                separator_counts[c] += 1
+        separator, _ = max(
+            separator_counts.items(),
+            key=lambda sep_count: sep_count[1]
+        )
+
         name_tokens = name_only.split(separator)
-        for t in name_tokens:
-            if t.startswith('r') and len(t) > 1:
-                return t
-        return ""
+        return next((t for t in name_tokens if len(t) > 1 and t[0] == 'r'), "")
+
+    def _basename(self, filename: str) -> str:
+        """ Gets the name (no parent folders) of the file, this is used for
+        multiple summary fields of each file so is cached.
+        """
+        name = self._basename_cache.get(filename)
+        if name is None:
+            name = Path(filename).name
+            self._basename_cache[filename] = name
+        return name
+
+    def _summary_node_count(self, density_check: QajsonCheck) -> object:
+        if density_check:
+            density_data = density_check.outputs.data
+            # the density summary `total_soundings` is the sum of the
+            # histogram counts, so the number of nodes. It's only missing from
+            # outputs generated by older versions of the density check.
+            total_nodes = density_data.get("summary", {}).get("total_soundings")
+            if total_nodes is not None:
+                return total_nodes
+            return sum(density_data["chart"]["data"].values())
+        else:
+            return "No density check"
+
+    def _build_summary_handlers(
+            self
+        ) -> Dict[Tuple[str, str], Tuple[Optional[str], Callable]]:
+        """ Builds a lookup of (field_section, field_name) to the name of the
+        check the field is derived from (None if no check is needed) and the
+        function used to calculate the summary value for that field. Each
+        function accepts the check (None if there's no completed check) and
+        the filename.
+        """
+        no_density = "No density check"
+        no_tvu = "No TVU check"
+        no_res = "No resolution check"
+        return {
+            ("header", "File Name"): (
+                None,
+                lambda c, fn: self._basename(fn)
+            ),
+            ("header", "Latest Update"): (
+                None,
+                lambda c, fn: self._revision_from_filename(self._basename(fn))
+            ),
+            ("header", "Summary"): (
+                None,
+                lambda c, fn: ""
+            ),
+            ("header", "Number of Nodes"): (
+                DensityCheck.name,
+                lambda c, fn: self._summary_node_count(c)
+            ),
+            ("DENSITY", "Number of Nodes with density fails"): (
+                DensityCheck.name,
+                lambda c, fn: (
+                    c.outputs.data["summary"]["under_threshold_soundings"]
+                    if c else no_density
+                )
+            ),
+            ("DENSITY", r"% of nodes with"): (
+                DensityCheck.name,
+                lambda c, fn: (
+                    c.outputs.data["summary"]["percentage_over_threshold"]
+                    if c else no_density
+                )
+            ),
+            # TODO: need to understand this metric
+            ("DENSITY", r"100% of nodes on SF"): (
+                None,
+                lambda c, fn: ""
+            ),
+            # User entered field (entered into the XLSX), so just leave empty
+            ("DENSITY", "Density Check comment"): (
+                None,
+                lambda c, fn: ""
+            ),
+            ("UNCERTAINTY", "Number of Nodes with Uncertainty Fails"): (
+                TvuCheck.name,
+                lambda c, fn: c.outputs.data["failed_cell_count"] if c else no_tvu
+            ),
+            ("UNCERTAINTY", r"% of Nodes with  Uncertainty Fails"): (
+                TvuCheck.name,
+                lambda c, fn: (
+                    c.outputs.data["fraction_failed"] * 100 if c else no_tvu
+                )
+            ),
+            ("UNCERTAINTY", "TVU Check comment"): (
+                None,
+                lambda c, fn: ""
+            ),
+            ("RESOLUTION", "Resolution Check QAX Message"): (
+                ResolutionCheck.name,
+                lambda c, fn: c.outputs.check_state if c else no_res
+            ),
+        }
+
+    def _get_summary_file_checks(
+            self,
+            filename: str,
+            qajson: QajsonRoot
+        ) -> List[QajsonCheck]:
+        """ Gets the checks of the qajson that include the given file. These
+        are found with the inherited check filters once per file, and then
+        cached as all summary fields for a file use the same checks.
+        """
+        self._validate_summary_cache(qajson)
+        if self._summary_checks is None:
+            self._summary_checks = self._get_qajson_checks(qajson)
+
+        file_checks = self._summary_file_checks.get(filename)
+        if file_checks is None:
+            file_checks = self._checks_filtered_by_file(
+                filename, self._summary_checks)
+            self._summary_file_checks[filename] = file_checks
+        return file_checks
+
+    def _get_summary_check(
+            self,
+            filename: str,
+            check_name: str,
+            qajson: QajsonRoot
+        ) -> Optional[QajsonCheck]:
+        """ Gets the check with the given name for the given file. Returns None
+        if there is no check, or if it didn't complete. If the check failed
+        or was aborted we can't rely on any of its outputs so it shouldn't be
+        included in the summary either.
+        """
+        file_checks = self._get_summary_file_checks(filename, qajson)
+        # should really only be one
+        named_checks = self._checks_filtered_by_name(check_name, file_checks)
+        if len(named_checks) == 0:
+            return None
+        check = named_checks[0]
+        if check.outputs.execution.status != 'completed':
+            return None
+        return check
+
+    def invalidate_summary_cache(self) -> None:
+        """ Clears the cached summary details. This must be called if the
+        qajson is changed (other than by `run`) between calls to
+        `get_summary_value` that don't start with `get_summary_details`.
+        """
+        self._summary_checks = None
+        self._summary_file_checks = {}
+        self._summary_percentage_node_number = None
+        self._summary_cache_qajson_ref = None
+
+    def _validate_summary_cache(self, qajson: QajsonRoot) -> None:
+        """ Clears the cached summary details if they were built from a
+        different qajson
+        """
+        cached_qajson = None
+        if self._summary_cache_qajson_ref is not None:
+            cached_qajson = self._summary_cache_qajson_ref()
+        if qajson is not cached_qajson:
+            self.invalidate_summary_cache()
+            self._summary_cache_qajson_ref = weakref.ref(qajson)
 
     def get_summary_value(
             self,
@@ -163,101 +379,27 @@ class MbesGridChecksQaxPlugin(QaxCheckToolPlugin):
         ) -> object:
         """
         """
-        checks = self._get_qajson_checks(qajson)
-        file_checks = self._checks_filtered_by_file(filename, checks)
-
-        density_check = None
-        density_checks = self._checks_filtered_by_name(
-            'Density Check',
-            file_checks
-        )
-        # should really only be one
-        if len(density_checks) >= 1:
-            density_check = density_checks[0]
-        
-            # check if the density check failed, or was aborted. If so then
-            # we can't rely on any of its outputs so this shouldn't be
-            # included in the summary either
-            if density_check.outputs.execution.status != 'completed':
-                density_check = None
-
-        tvu_check = None
-        tvu_checks = self._checks_filtered_by_name(
-            'Total Vertical Uncertainty Check',
-            file_checks
-        )
-        if len(tvu_checks) >= 1:
-            tvu_check = tvu_checks[0]
-            if tvu_check.outputs.execution.status != 'completed':
-                tvu_check = None
-
-        res_check = None
-        res_checks = self._checks_filtered_by_name(
-            'Resolution Check',
-            file_checks
-        )
-        if len(res_checks) >= 1:
-            res_check = res_checks[0]
-            if res_check.outputs.execution.status != 'completed':
-                res_check = None
-
-        if field_section == 'header' and field_name == "File Name":
-            return Path(filename).name
-        elif field_section == 'header' and field_name == "Latest Update":
-            fn = Path(filename).name
-            return self._revision_from_filename(fn)
-        elif field_section == 'header' and field_name == "Summary":
-            return ""
-        elif field_section == 'header' and field_name == "Number of Nodes":
-            if density_check:
-                density_data = density_check.outputs.data
-                node_count = 0
-                for _, v in density_data["chart"]["data"].items():
-                    node_count += v
-                return node_count
-            else:
-                return "No density check"
-        elif field_section == 'DENSITY' and field_name == "Number of Nodes with density fails":
-            if density_check:
-                density_data = density_check.outputs.data
-                summary_data = density_data["summary"]
-                return summary_data["under_threshold_soundings"]
-            else:
-                return "No density check"
-        elif field_section == 'DENSITY' and field_name.startswith(r"% of nodes with"):
-            if density_check:
-                density_data = density_check.outputs.data
-                summary_data = density_data["summary"]
-                return summary_data["percentage_over_threshold"]
-            else:
-                return "No density check"
-        elif field_section == 'DENSITY' and field_name == r"100% of nodes on SF":
-            # TODO: need to understand this metric
-            return ""
-        elif field_section == 'DENSITY' and field_name == "Density Check comment":
-            # User entered field (entered into the XLSX), so just leave empty
-            return ""
-        elif field_section == 'UNCERTAINTY' and field_name == "Number of Nodes with Uncertainty Fails":
-            if tvu_check:
-                return tvu_check.outputs.data["failed_cell_count"]
-            else:
-                return "No TVU check"
-        elif field_section == 'UNCERTAINTY' and field_name == r"% of Nodes with  Uncertainty Fails":
-            if tvu_check:
-                return tvu_check.outputs.data["fraction_failed"] * 100
-            else:
-                return "No TVU check"
-        elif field_section == 'UNCERTAINTY' and field_name == "TVU Check comment":
-            return ""
-        elif field_section == 'RESOLUTION' and field_name == "Resolution Check QAX Message":
-            if res_check:
-                return res_check.outputs.check_state
-            else:
-                return "No resolution check"
-
-        else:
+        handler_details = self._summary_handlers.get((field_section, field_name))
+        if handler_details is None:
+            # some field names include a parameter value, so are matched on
+            # their prefix
+            handler_details = next(
+                (
+                    self._summary_handlers[(section, prefix)]
+                    for section, prefix in self._summary_prefix_fields
+                    if section == field_section and field_name.startswith(prefix)
+                ),
+                None
+            )
+        if handler_details is None:
             return "No summary value"
+        check_name, handler = handler_details
 
+        # only look up the check this field needs, some need none at all
+        check = None
+        if check_name is not None:
+            check = self._get_summary_check(filename, check_name, qajson)
+        return handler(check, filename)
 
     def run(
             self,
@@ -290,13 +432,22 @@ class MbesGridChecksQaxPlugin(QaxCheckToolPlugin):
 
         self.exe.run(pg_call, qajson_update_callback, is_stopped)
 
+        # the input file details includes a number of qajson check references
+        # we need to make sure we only update the output qajson for the current
+        # check. These are indexed by check id once for each input file details.
+        qajson_checks_by_id = {}
         for (ifd, check_id), check in self.exe.check_result_cache.items():
-            for i, qajson_check in enumerate(ifd.qajson_checks):
-                # the input file details includes a number of qajson check references
-                # we need to make sure we only update the output qajson for the current
-                # check.
-                if (qajson_check.info.id == check_id):
-                    qajson_check.outputs = check.get_outputs()
+            if ifd not in qajson_checks_by_id:
+                by_id = {}
+                for qajson_check in ifd.qajson_checks:
+                    by_id.setdefault(qajson_check.info.id, []).append(qajson_check)
+                qajson_checks_by_id[ifd] = by_id
+            for qajson_check in qajson_checks_by_id[ifd].get(check_id, []):
+                qajson_check.outputs = check.get_outputs()
+
+        # check outputs have changed, so any cached summary details are no
+        # longer valid
+        self.invalidate_summary_cache()
 
         # MBESGC runs all checks over each tile of an input file, therefore
         # it's only possible to update the qajson once all checks have been
@@ -344,3 +495,16 @@ class MbesGridChecksQaxPlugin(QaxCheckToolPlugin):
         case a list of the bands, and the resolution of the dataset.
         """
         return get_file_details(filename)
+
+
+# lookup of the supported file types by their (lower case) file extension
+_FILE_TYPES_BY_EXT: Dict[str, QaxFileType] = {
+    ft.extension.lower(): ft for ft in MbesGridChecksQaxPlugin.file_types
+}
+
+
+def get_file_type_for(path: str) -> Optional[QaxFileType]:
+    """ Gets the file type supported by this plugin for the given path based
+    on its extension. Returns None if the file type is not supported.
+    """
+    return _FILE_TYPES_BY_EXT.get(Path(path).suffix.lstrip('.').lower())
@@ -1,10 +1,14 @@
 import unittest
 import json
+import os.path
+import tempfile
+
+from osgeo import gdal, osr
 
 from ausseabed.qajson.model import QajsonCheck
 
 from ausseabed.mbesgc.lib.data import \
-    inputs_from_qajson_checks, InputFileDetails, BandType
+    inputs_from_qajson_checks, get_input_details, InputFileDetails, BandType
 
 check01_str = """
 {
@@ -170,3 +174,40 @@ class TestData(unittest.TestCase):
         passed, messages = a.validate()
         self.assertTrue(passed)
         self.assertEqual(len(messages), 0)
+
+    def test_get_bag_input_details(self):
+        geotransform = (100.0, 2.0, 0.0, 200.0, 0.0, -2.0)
+        srs = osr.SpatialReference()
+        srs.ImportFromEPSG(32755)
+        projection = srs.ExportToWkt()
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # GDAL identifies the format by content, so a two band GeoTIFF
+            # stands in for each of the bag files
+            depth_file = os.path.join(tmp_dir, 'survey.bag')
+            density_file = os.path.join(tmp_dir, 'survey_Density.bag')
+            drv = gdal.GetDriverByName('GTiff')
+            for filename in [depth_file, density_file]:
+                ds = drv.Create(filename, 5, 4, 2, gdal.GDT_Float32)
+                ds.SetGeoTransform(geotransform)
+                ds.SetProjection(projection)
+                ds.FlushCache()
+                del ds
+
+            inputs = get_input_details([depth_file])
+
+        self.assertEqual(len(inputs), 1)
+        ifd = inputs[0]
+        self.assertEqual(ifd.size_x, 5)
+        self.assertEqual(ifd.size_y, 4)
+        self.assertEqual(tuple(ifd.geotransform), geotransform)
+        self.assertEqual(ifd.projection, projection)
+
+        self.assertCountEqual(
+            ifd.input_band_details,
+            [
+                (depth_file, 1, BandType.depth),
+                (depth_file, 2, BandType.uncertainty),
+                (density_file, 1, BandType.density),
+            ]
+        )
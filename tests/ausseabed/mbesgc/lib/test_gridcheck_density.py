@@ -98,6 +98,33 @@ class TestDensityCheck(unittest.TestCase):
         self.assertEqual(c_a.density_histogram[9], 1)
         self.assertEqual(c_a.density_histogram[10], 1)
 
+    def test_result_hist_array_merge(self):
+        # histograms of different lengths, the merged histogram must grow to
+        # include the largest sounding count
+        c_a = DensityCheck([])
+        c_a.run(
+            ifd=self.dummy_ifd,
+            tile=self.dummy_tile,
+            depth=None,
+            density=np.ma.array([[0, 0, 1], [2, 2, 2]], mask=False),
+            uncertainty=None,
+            pinkchart=None
+        )
+
+        c_b = DensityCheck([])
+        c_b.run(
+            ifd=self.dummy_ifd,
+            tile=self.dummy_tile,
+            depth=None,
+            density=np.ma.array([[0, 2], [300, 300]], mask=False),
+            uncertainty=None,
+            pinkchart=None
+        )
+
+        c_a.merge_results(c_b)
+
+        self.assertEqual(c_a.density_histogram, {0: 3, 1: 1, 2: 4, 300: 2})
+
     def test_density_threshold(self):
         input_params = [
             QajsonParam("Minimum Soundings per node", 5),
@@ -154,3 +181,42 @@ class TestDensityCheck(unittest.TestCase):
         # 95% so this should fail
         # "Minimum Soundings per node" is set to 0 so this wont be tripped.
         self.assertEqual(output.check_state, GridCheckState.cs_fail)
+
+    def test_density_unmasked_fill_values(self):
+        # a density band without nodata has its fill values included, these
+        # may be negative or very large sounding counts
+        density = np.ma.array(
+            np.array(
+                [
+                    [10, 10, -1, 10],
+                    [10, 2, 10, 2147483647],
+                ],
+                dtype=np.int64
+            ),
+            mask=False
+        )
+
+        input_params = [
+            QajsonParam("Minimum Soundings per node", 5),
+            QajsonParam("Minimum Soundings per node percentage", 50),
+        ]
+
+        check = DensityCheck(input_params)
+        check.run(
+            ifd=self.dummy_ifd,
+            tile=self.dummy_tile,
+            depth=None,
+            density=density,
+            uncertainty=None,
+            pinkchart=None
+        )
+
+        self.assertEqual(
+            check.density_histogram,
+            {-1: 1, 2: 1, 10: 5, 2147483647: 1}
+        )
+
+        output = check.get_outputs()
+        self.assertEqual(output.data['summary']['total_soundings'], 8)
+        self.assertEqual(output.data['summary']['under_threshold_soundings'], 2)
+        self.assertEqual(output.check_state, GridCheckState.cs_pass)
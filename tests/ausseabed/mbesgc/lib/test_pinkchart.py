@@ -83,6 +83,35 @@ class TestPinkChart(unittest.TestCase):
         )
 
         pc.process()
+
+    def test_duplicate_output_rasters(self):
+        pc = PinkChartProcessor(
+            [self.raster_file, self.raster_file.with_suffix('.tif')],
+            self.pinkchart_file,
+            [self.raster_file_out, self.raster_file_out],
+            self.rasterised_file
+        )
+
+        with self.assertRaises(RuntimeError):
+            pc.process()
+
+    def test_generate_pinkchart_raster_existing_outputs(self):
+        pc = PinkChartProcessor(
+            [self.raster_file],
+            self.pinkchart_file,
+            [self.raster_file_out],
+            self.rasterised_file
+        )
+
+        # the second run must replace the outputs written by the first
+        pc.process()
+        pc.process()
+
+        out_raster: gdal.Dataset = gdal.Open(str(self.raster_file_out))
+        self.assertIsNotNone(out_raster)
+        self.assertEqual(out_raster.RasterXSize, pc.size_x)
+        self.assertEqual(out_raster.RasterYSize, pc.size_y)
+        del out_raster
     
 
     def test_generate_pinkchart_raster_different_projections(self):
@@ -1,6 +1,6 @@
 import unittest
 
-from ausseabed.mbesgc.lib.tiling import Tile, get_tiles
+from ausseabed.mbesgc.lib.tiling import Tile, get_tiles, get_tile_index
 
 
 class TestTiling(unittest.TestCase):
@@ -22,3 +22,15 @@ class TestTiling(unittest.TestCase):
         self.assertEqual(tiles[-1].max_y, max_y)
 
         self.assertEqual(len(tiles), 3*4)
+
+    def test_tile_index_locate(self):
+        tile_index = get_tile_index(0, 0, 14, 10, 5, 3)
+
+        self.assertEqual(len(tile_index.tiles), 3*4)
+
+        for tile in tile_index.tiles:
+            self.assertIs(tile_index.locate(tile.min_x, tile.min_y), tile)
+            self.assertIs(tile_index.locate(tile.max_x - 1, tile.max_y - 1), tile)
+
+        with self.assertRaises(ValueError):
+            tile_index.locate(14, 0)
@@ -1,7 +1,7 @@
 import unittest
 from typing import List
 
-from ausseabed.mbesgc.qax.plugin import MbesGridChecksQaxPlugin
+from ausseabed.mbesgc.qax.plugin import MbesGridChecksQaxPlugin, get_file_type_for
 
 class TestGrouping(unittest.TestCase):
 
@@ -12,3 +12,8 @@ class TestGrouping(unittest.TestCase):
         revision = plugin._revision_from_filename(fn)
 
         self.assertEqual(revision, 'r123')
+
+    def test_file_type_for(self):
+        self.assertEqual(get_file_type_for("/data/foo.TIF").group, "Survey DTMs")
+        self.assertEqual(get_file_type_for("foo.shp").group, "Coverage Area")
+        self.assertIsNone(get_file_type_for("foo.txt"))